@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for grid construction, board rendering, circle detection and
+ZeroMQ transport.
+
+Results are written as JSON, pass a previous result file with --baseline to
+report regressions between runs.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import pickle
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import tracemalloc
+import unittest
+
+import cv2
+import numpy as np
+import zmq
+
+import draw_chessboard
+import draw_circleboard
+from consumer import detectCircles, binarize
+from unique_grid import Grid
+
+
+SUITES = ['grid', 'draw', 'detect', 'transport']
+
+# Compared metrics: (name, getter, True if higher value is worse)
+METRICS = [
+    ('time', lambda r: r['time']['median'], True),
+    ('peak_memory', lambda r: r.get('peak_memory'), True),
+    ('frames_per_second', lambda r: r.get('frames_per_second'), False),
+    ('megabytes_per_second', lambda r: r.get('megabytes_per_second'), False),
+]
+
+
+def quiet():
+    """ Silence the progress printing of Grid and the draw scripts """
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def measure(func, repeat = 1):
+    """ Call func `repeat` times, return list of durations (s) and the last result """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def peakMemory(func):
+    """ Return peak memory (bytes) allocated while calling func """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def summarize(times):
+    """ Summary statistics of a list of durations (s), None values for empty list """
+    if len(times) == 0:
+        return {'runs': 0, 'min': None, 'median': None, 'mean': None, 'p95': None, 'max': None}
+    times = sorted(times)
+    return {
+        'runs': len(times),
+        'min': times[0],
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'p95': times[int(round(0.95 * (len(times) - 1)))],
+        'max': times[-1],
+    }
+
+
+def formatTime(seconds):
+    """ Format duration of progress output, empty runs have no duration """
+    if seconds is None:
+        return "n/a"
+    return "%.6fs" % seconds
+
+
+def parseSizes(text):
+    """ Parse "4x4,6x8" into [(4, 4), (6, 8)] """
+    return [tuple(int(v) for v in size.split('x')) for size in text.split(',')]
+
+
+def parseInts(text):
+    return [int(v) for v in text.split(',')]
+
+
+def benchGrid(sizes, patch_sizes, repeat):
+    """ Grid.construct and Grid.isValid time and peak memory """
+    results = []
+    for rows, cols in sizes:
+        for patch_size in patch_sizes:
+            if patch_size > min(rows, cols):
+                continue
+            params = {'rows': rows, 'cols': cols, 'patch_size': patch_size}
+            grid = Grid(rows, cols, patch_size)
+
+            with quiet():
+                times, _ = measure(grid.construct, repeat)
+                peak = peakMemory(grid.construct)
+            valid = grid.grid is not None
+            summary = summarize(times)
+            results.append({'name': 'grid.construct', 'params': params,
+                            'time': summary, 'peak_memory': peak,
+                            'constructed': valid})
+            print("grid.construct %s: %s" % (params, formatTime(summary['median'])))
+
+            if not valid:
+                # isValid can not be evaluated on a failed construction
+                continue
+
+            with quiet():
+                times, ok = measure(grid.isValid, repeat)
+                peak = peakMemory(grid.isValid)
+            summary = summarize(times)
+            results.append({'name': 'grid.isValid', 'params': params,
+                            'time': summary, 'peak_memory': peak,
+                            'valid': ok})
+            print("grid.isValid %s: %s" % (params, formatTime(summary['median'])))
+    return results
+
+
+def benchDraw(dpis, rows, cols, patch_size, repeat):
+    """
+    draw_chessboard.draw and draw_circleboard.draw time per dpi
+
+    Peak memory is not measured, tracemalloc does not see the PIL image
+    buffer. Size of the rendered image is recorded instead.
+    """
+    results = []
+    for module in (draw_chessboard, draw_circleboard):
+        name = module.__name__ + '.draw'
+        for dpi in dpis:
+            params = {'rows': rows, 'cols': cols, 'patch_size': patch_size, 'dpi': dpi}
+            draw = lambda: module.draw(cols = cols, rows = rows, patch_size = patch_size, dpi = dpi)
+            with quiet():
+                times, image = measure(draw, repeat)
+            if repeat > 0 and image is None:
+                print(name + " failed for " + str(params))
+                continue
+            summary = summarize(times)
+            result = {'name': name, 'params': params, 'time': summary}
+            if image is not None:
+                width, height = image.size
+                result['image_size'] = [width, height]
+                result['image_bytes'] = width * height * len(image.getbands())
+            results.append(result)
+            print("%s %s: %s" % (name, params, formatTime(summary['median'])))
+    return results
+
+
+def syntheticFrames(board, count, frame_size, rng):
+    """
+    Warp rendered board into `count` BGR frames of `frame_size` (width, height)
+    with random perspective and mild sensor noise.
+    """
+    src = cv2.cvtColor(np.array(board), cv2.COLOR_GRAY2BGR)
+    h, w = src.shape[:2]
+    W, H = frame_size
+
+    # centered board covering most of the frame
+    scale = 0.8 * min(W / w, H / h)
+    bw, bh = w * scale, h * scale
+    x0, y0 = (W - bw) / 2, (H - bh) / 2
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    centered = np.float32([[x0, y0], [x0 + bw, y0], [x0 + bw, y0 + bh], [x0, y0 + bh]])
+
+    frames = []
+    for _ in range(count):
+        jitter = rng.uniform(-0.08, 0.08, (4, 2)) * (W, H)
+        M = cv2.getPerspectiveTransform(corners, np.float32(centered + jitter))
+        frame = cv2.warpPerspective(src, M, (W, H), borderValue=(255, 255, 255))
+        noise = rng.normal(0, 4, frame.shape)
+        frames.append(np.uint8(np.clip(frame + noise, 0, 255)))
+    return frames
+
+
+def benchDetect(count, frame_size, dpi, rows, cols, patch_size, seed):
+    """ detectCircles and binarize per-frame latency on warped boards """
+    results = []
+    for module in (draw_chessboard, draw_circleboard):
+        with quiet():
+            board = module.draw(cols = cols, rows = rows, patch_size = patch_size, dpi = dpi)
+        if board is None:
+            print(module.__name__ + " failed to draw board")
+            continue
+        frames = syntheticFrames(board, count, frame_size, np.random.default_rng(seed))
+        params = {'board': module.__name__, 'rows': rows, 'cols': cols,
+                  'patch_size': patch_size, 'dpi': dpi,
+                  'frame_size': list(frame_size), 'frames': count}
+
+        # warm up OpenCV before timing
+        if frames:
+            detectCircles(frames[0], show = False)
+
+        detect_times = []
+        binarize_times = []
+        detected = []
+        for frame in frames:
+            times, points = measure(lambda: detectCircles(frame, show = False))
+            detect_times += times
+            detected.append(0 if points is None else len(points))
+            if points:
+                times, _ = measure(lambda: binarize(points))
+                binarize_times += times
+
+        summary = summarize(detect_times)
+        results.append({'name': 'consumer.detectCircles', 'params': params,
+                        'time': summary,
+                        'circles_per_frame': statistics.mean(detected) if detected else 0})
+        print("consumer.detectCircles %s: %s" % (module.__name__, formatTime(summary['median'])))
+        if binarize_times:
+            summary = summarize(binarize_times)
+            results.append({'name': 'consumer.binarize', 'params': params,
+                            'time': summary})
+            print("consumer.binarize %s: %s" % (module.__name__, formatTime(summary['median'])))
+    return results
+
+
+def benchTransport(urls, count, frame_size, seed, timeout = 10.0):
+    """
+    Streamer -> consumer throughput with the same PUSH/PULL sockets and
+    {image, timestamp} messages as streamer.py and consumer.py.
+
+    Sending or receiving a message taking longer than `timeout` (s) fails
+    the benchmark instead of blocking the run.
+    """
+    W, H = frame_size
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (H, W, 3), dtype=np.uint8)
+    message_bytes = len(pickle.dumps({'image': frame, 'timestamp': datetime.datetime.now()},
+                                     pickle.DEFAULT_PROTOCOL))
+
+    context = zmq.Context()
+    results = []
+    try:
+        for url in urls:
+            sender = context.socket(zmq.PUSH)
+            receiver = context.socket(zmq.PULL)
+            latencies = []
+            errors = []
+            thread = None
+            try:
+                sender.setsockopt(zmq.SNDTIMEO, int(timeout * 1000))
+                sender.bind(url)
+                receiver.set_hwm(1)
+                receiver.setsockopt(zmq.RCVTIMEO, int(timeout * 1000))
+                receiver.connect(url)
+
+                def receive():
+                    try:
+                        for _ in range(count):
+                            work = receiver.recv_pyobj()
+                            latencies.append((datetime.datetime.now() - work['timestamp']).total_seconds())
+                    except zmq.ZMQError as e:
+                        errors.append(e)
+
+                thread = threading.Thread(target=receive, daemon=True)
+                start = time.perf_counter()
+                thread.start()
+                for _ in range(count):
+                    sender.send_pyobj({'image': frame, 'timestamp': datetime.datetime.now()})
+                thread.join(timeout)
+                elapsed = time.perf_counter() - start
+                if thread.is_alive() or errors:
+                    raise RuntimeError("receiving from %s failed after %i of %i messages: %r"
+                                       % (url, len(latencies), count, errors))
+            finally:
+                if thread is not None:
+                    # receiver gives up after `timeout`, do not close its socket under it
+                    thread.join(timeout)
+                sender.close(linger=0)
+                receiver.close(linger=0)
+
+            transport = url.split(':')[0]
+            params = {'transport': transport, 'frame_size': list(frame_size), 'messages': count}
+            results.append({'name': 'zmq.transport', 'params': params,
+                            'time': summarize(latencies),
+                            'message_bytes': message_bytes,
+                            'frames_per_second': count / elapsed,
+                            'megabytes_per_second': count * message_bytes / elapsed / 1e6})
+            print("zmq.transport %s: %.1f frames/s" % (transport, count / elapsed))
+    finally:
+        # do not wait for sockets a failed run may have left behind
+        context.destroy(linger=0)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Print METRICS of each result against the baseline run, return number of
+    metrics worse than `threshold` times the baseline.
+    """
+    key = lambda r: (r['name'], json.dumps(r['params'], sort_keys=True))
+    previous = {key(r): r for r in baseline['results']}
+
+    regressions = 0
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for metric, get, higher_is_worse in METRICS:
+            before, after = get(old), get(result)
+            if not before or not after:
+                continue
+            # ratio > 1 means worse
+            ratio = after / before if higher_is_worse else before / after
+            flag = ''
+            if ratio > threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print("%s %s %s: %.6g -> %.6g (x%.2f)%s" % (result['name'], result['params'],
+                  metric, before, after, ratio, flag))
+    return regressions
+
+
+def machine():
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'pyzmq': zmq.__version__,
+        'libzmq': zmq.zmq_version(),
+    }
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_summarize(self):
+        summary = summarize([0.3, 0.1, 0.2, 0.4])
+        self.assertEqual(summary['runs'], 4)
+        self.assertEqual(summary['min'], 0.1)
+        self.assertAlmostEqual(summary['median'], 0.25)
+        self.assertAlmostEqual(summary['mean'], 0.25)
+        self.assertEqual(summary['p95'], 0.4)
+        self.assertEqual(summary['max'], 0.4)
+
+    def test_summarizeEmpty(self):
+        summary = summarize([])
+        self.assertEqual(summary['runs'], 0)
+        self.assertIsNone(summary['median'])
+
+    def test_parseSizes(self):
+        self.assertEqual(parseSizes("4x4,6x8"), [(4, 4), (6, 8)])
+
+    def test_compare(self):
+        result = lambda name, median, **extra: dict({'name': name, 'params': {'rows': 4},
+                                                     'time': {'median': median}}, **extra)
+        baseline = {'results': [result('a', 1.0, peak_memory=100),
+                                result('b', 1.0, frames_per_second=100.0)]}
+        with quiet():
+            # no change, new result not in baseline is skipped
+            self.assertEqual(compare([result('a', 1.0, peak_memory=100),
+                                      result('c', 9.0)], baseline, 1.2), 0)
+            # slower
+            self.assertEqual(compare([result('a', 1.5, peak_memory=100)], baseline, 1.2), 1)
+            # more memory
+            self.assertEqual(compare([result('a', 1.0, peak_memory=200)], baseline, 1.2), 1)
+            # lower throughput
+            self.assertEqual(compare([result('b', 1.0, frames_per_second=50.0)], baseline, 1.2), 1)
+            # empty summary is not compared
+            self.assertEqual(compare([result('a', None, peak_memory=100)], baseline, 1.2), 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark grid construction, rendering, detection and transport.')
+    parser.add_argument("--suites", nargs='+', choices=SUITES, default=SUITES, help="benchmarks to run")
+    parser.add_argument("--repeat", help="repetitions of grid and draw benchmarks", type=int, default=3)
+    parser.add_argument("--seed", help="seed of synthetic frames", type=int, default=0)
+
+    parser.add_argument("--grid-sizes", help="grid sizes as ROWSxCOLS,...", default="4x4,6x6,8x8")
+    parser.add_argument("--patch-sizes", help="patch sizes as N,...", default="3,4")
+
+    parser.add_argument("--board", help="board size as ROWSxCOLS", default="8x6")
+    parser.add_argument("--patch","-p", help="size of patch of circles of the board", type=int, default=3)
+    parser.add_argument("--dpi", help="dots per inch (DPI) values of draw benchmark", default="75,150,300")
+
+    parser.add_argument("--frames", help="number of synthetic frames", type=int, default=50)
+    parser.add_argument("--frame-size", help="frame size as WIDTHxHEIGHT", default="640x480")
+    parser.add_argument("--detect-dpi", help="dots per inch (DPI) of board warped into frames", type=int, default=100)
+
+    parser.add_argument("--messages", help="number of messages sent per transport", type=int, default=200)
+
+    parser.add_argument("--out","-o", help="output file", default="benchmark.json")
+    parser.add_argument("--baseline","-b", help="previous output file to compare against")
+    parser.add_argument("--threshold", help="slowdown ratio reported as regression", type=float, default=1.2)
+
+    args = parser.parse_args()
+
+    rows, cols = parseSizes(args.board)[0]
+    frame_size = parseSizes(args.frame_size)[0]
+
+    def transport():
+        ipc = os.path.join(tempfile.gettempdir(), 'cv-utils-benchmark-' + str(os.getpid()))
+        try:
+            return benchTransport(['inproc://cv-utils-benchmark', 'ipc://' + ipc],
+                                  args.messages, frame_size, args.seed)
+        finally:
+            if os.path.exists(ipc):
+                os.remove(ipc)
+
+    suites = {
+        'grid': lambda: benchGrid(parseSizes(args.grid_sizes), parseInts(args.patch_sizes), args.repeat),
+        'draw': lambda: benchDraw(parseInts(args.dpi), rows, cols, args.patch, args.repeat),
+        'detect': lambda: benchDetect(args.frames, frame_size, args.detect_dpi, rows, cols, args.patch, args.seed),
+        'transport': transport,
+    }
+
+    output = {'created': datetime.datetime.now().isoformat(),
+              'machine': machine(),
+              'results': [],
+              'errors': []}
+
+    for suite in args.suites:
+        try:
+            output['results'] += suites[suite]()
+        except Exception as e:
+            # keep results of the other suites, record the failure instead
+            traceback.print_exc()
+            output['errors'].append({'suite': suite, 'error': repr(e)})
+
+        # write after every suite so that an interrupted run leaves a file
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=2)
+    print("results written to " + args.out)
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(output['results'], baseline, args.threshold)
+
+    if regressions > 0 or output['errors']:
+        sys.exit(1)
@@ -4,9 +4,9 @@ import zmq
 import cv2
 import datetime
 import argparse
+import unittest
 import numpy as np
 from sklearn import mixture
-from sets import Set
 
 import ocv_calibration
 
@@ -92,7 +92,15 @@ def drawCorners(img):
             cv2.waitKey(1)
 
     
-def detectCircles(image):
+def circleValue(image, c, margin = 5):
+    """ Brightest pixel in window of `margin` around center c, None if window is out of image """
+    x, y = c
+    pxs = image[max(y-margin,0):y+margin, max(x-margin,0):x+margin]
+    if pxs.size == 0:
+        return None
+    return np.amax(pxs)
+
+def detectCircles(image, show = True):
     gray = cv2.cvtColor(image,cv2.COLOR_BGR2GRAY)
     blur = cv2.GaussianBlur(gray, (13, 13), 6)
 
@@ -107,16 +115,18 @@ def detectCircles(image):
         points = []
         circles = np.uint16(np.around(circles))
         for circle in circles[0]:
-            c = (circle[0], circle[1]) # x, y:
-            r = circle[2]
+            c = (int(circle[0]), int(circle[1])) # x, y:
+            r = int(circle[2])
             cv2.circle(img, c, r, (0, 200, 0), 4)
 
-            pxs = img[c[1]-margin:c[1]+margin, c[0]-margin:c[0]+margin]
-            v = np.amax(pxs)
+            v = circleValue(img, c, margin)
+            if v is None:
+                continue
             cv2.putText(img, str(v), c, cv2.FONT_HERSHEY_SIMPLEX, 0.3, (200, 255, 0))
             points.append((c, v))
 
-    cv2.imshow("circles", img)
+    if show:
+        cv2.imshow("circles", img)
 
     return points
 
@@ -200,9 +210,27 @@ def consumer(url):
         cv2.imshow('frame',image)
 
 
+class TestDetectCircles(unittest.TestCase):
+    def test_circleValueBorder(self):
+        image = np.zeros((100, 100, 3), np.uint8)
+        image[0:3, 0:3] = 255
+        self.assertEqual(circleValue(image, (1, 2)), 255)
+        self.assertEqual(circleValue(image, (50, 50)), 0)
+        self.assertIsNone(circleValue(image, (200, 50)))
 
-parser = argparse.ArgumentParser(description='Receive images from 0MQ for processing.')
-parser.add_argument('--url', help='url of the streamer ("tcp://192.168.1.200:5557")')
+    def test_circleNearBorder(self):
+        image = np.full((240, 320, 3), 255, np.uint8)
+        cv2.circle(image, (3, 120), 30, (0, 0, 0), -1)
+        cv2.circle(image, (160, 237), 30, (0, 0, 0), -1)
+        # both circles are detected and their windows reach over the image border
+        points = detectCircles(image, show = False)
+        self.assertIsNotNone(points)
+        self.assertEqual(len(points), 2)
 
-args = parser.parse_args()
-consumer(args.url)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Receive images from 0MQ for processing.')
+    parser.add_argument('--url', help='url of the streamer ("tcp://192.168.1.200:5557")')
+
+    args = parser.parse_args()
+    consumer(args.url)
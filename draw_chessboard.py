@@ -105,18 +105,18 @@ def draw(*, cols = 0, rows = 0, patch_size = 0, square_size = 0, dpi = 300):
     return image
 
 
-parser = argparse.ArgumentParser()
-parser.add_argument("--rows","-r", help="number of rows", type=int, default=0)
-parser.add_argument("--cols","-c", help="number of rows", type=int, default=0)
-parser.add_argument("--patch","-p", help="size of patch of circles", type=int, default=0)
-parser.add_argument("--square","-s", help="size of square (px)", type=int, default=0)
-parser.add_argument("--dpi", help="dots per inch (DPI)", type=int, default=300)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows","-r", help="number of rows", type=int, default=0)
+    parser.add_argument("--cols","-c", help="number of rows", type=int, default=0)
+    parser.add_argument("--patch","-p", help="size of patch of circles", type=int, default=0)
+    parser.add_argument("--square","-s", help="size of square (px)", type=int, default=0)
+    parser.add_argument("--dpi", help="dots per inch (DPI)", type=int, default=300)
 
-parser.add_argument("--out","-o", help="output file", default="chessboard.png")
+    parser.add_argument("--out","-o", help="output file", default="chessboard.png")
 
-args = parser.parse_args()
+    args = parser.parse_args()
 
 
-chessboard = draw(cols = args.cols, rows = args.rows, patch_size = args.patch, square_size = args.square, dpi = args.dpi)
-chessboard.save(args.out)
-
+    chessboard = draw(cols = args.cols, rows = args.rows, patch_size = args.patch, square_size = args.square, dpi = args.dpi)
+    chessboard.save(args.out)